@@ -16,8 +16,13 @@
 # * Experimental properties are heterogeneous; availability varies.
 # * This cell only builds the UI; no network calls occur until you press "Search".
 
-import io, base64, json, re, requests, contextlib, warnings, time, unicodedata
+import io, base64, json, re, requests, contextlib, warnings, time, unicodedata, functools, hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from urllib.parse import quote
+from urllib3.util import Retry
+import numpy as np
 import pandas as pd
 from IPython.display import display, clear_output, Markdown, HTML, Image
 import ipywidgets as widgets
@@ -68,6 +73,10 @@ def _silent_import_rdkit():
 
 _PCP, _pcp_msg = _silent_import("pubchempy")
 _P3D, _p3d_msg = _silent_import("py3Dmol")
+_RQC, _rqc_msg = _silent_import("requests_cache")
+_ORJSON, _orjson_msg = _silent_import("orjson")
+_XLSXW, _xlsxw_msg = _silent_import("xlsxwriter")
+_IJSON, _ijson_msg = _silent_import("ijson")
 _RDKIT, _rdkit_msg = _silent_import_rdkit()
 
 if _RDKIT:
@@ -77,23 +86,73 @@ if _PCP:
     import pubchempy as pcp
 if _P3D:
     import py3Dmol
+if _RQC:
+    import requests_cache
+if _ORJSON:
+    import orjson
+if _IJSON:
+    import ijson
+
+# Fast JSON decoding for large PUG-View payloads (bytes in, objects out)
+_json_loads = orjson.loads if _ORJSON else json.loads
 
 # ----------------------------
-# Robust PubChem networking for Binder/Voila
+# Robust networking for Binder/Voila (PubChem + ChEMBL share one session)
 # ----------------------------
 _UA = "chembl-bioactivity-report/0.2 (+https://github.com/your-org/chembl-bioactivity-report)"
-_SESS = requests.Session()
+# Persistent on-disk cache (when requests-cache is installed): repeated searches read from sqlite.
+_CACHE_FILE = "http_cache.sqlite"
+_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+class _SharedSession(requests_cache.CachedSession if _RQC else requests.Session):
+    """Process-wide session; chembl_webresource_client enters it with `with` on every call."""
+    def __exit__(self, *args):
+        pass  # keep pooled connections (and the cache) open
+
+if _RQC:
+    _SESS = _SharedSession(
+        _CACHE_FILE,
+        backend="sqlite",
+        expire_after=_CACHE_TTL,
+        allowable_codes=(200,),
+        allowable_methods=("GET", "HEAD", "POST"),  # ChEMBL pages via POST (read-only)
+        stale_if_error=True,
+    )
+else:
+    _SESS = _SharedSession()
 _SESS.headers.update({
     "User-Agent": _UA,
     "Accept": "application/json, text/plain;q=0.5",
+    # ChEMBL list queries are POSTs that the API treats as GETs; a no-op for plain GETs
+    "X-HTTP-Method-Override": "GET",
 })
+# ChEMBL calls don't go through _http_get, so give them the same 429/5xx backoff at the adapter level
+_SESS.mount("https://www.ebi.ac.uk/", requests.adapters.HTTPAdapter(max_retries=Retry(
+    total=3, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None,
+)))
+
+def _share_session_with_chembl():
+    """Route chembl_webresource_client through _SESS (keep-alive, cache, retries)."""
+    try:
+        from chembl_webresource_client.query import Query
+        from chembl_webresource_client.settings import Settings
+    except Exception:
+        return  # unknown client layout: leave it on its own sessions
+    Settings.Instance().CACHING = False  # _SESS does the caching
+    Query._get_session = lambda self: _SESS
 
-def _http_get(url: str, timeout: float = 30.0, retries: int = 3, backoff: float = 1.6):
+_share_session_with_chembl()
+
+# PubChem asks for <= 5 requests/second; keep the per-search fan-out below that.
+_PUBCHEM_WORKERS = 4
+
+def _http_get(url: str, timeout: float = 30.0, retries: int = 3, backoff: float = 1.6, stream: bool = False):
     """GET with tiny exponential backoff (handles 429/5xx/DNS hiccups)."""
     for attempt in range(retries):
         try:
-            r = _SESS.get(url, timeout=timeout, allow_redirects=True)
+            r = _SESS.get(url, timeout=timeout, allow_redirects=True, stream=stream)
             if r.status_code in (429,) or (500 <= r.status_code < 600):
+                r.close()
                 time.sleep(backoff ** attempt)
                 continue
             return r
@@ -104,6 +163,7 @@ def _http_get(url: str, timeout: float = 30.0, retries: int = 3, backoff: float
 # ----------------------------
 # ChEMBL helpers
 # ----------------------------
+@functools.lru_cache(maxsize=512)
 def get_chembl_id(compound: str) -> str:
     mol_client = new_client.molecule
     res = mol_client.filter(pref_name__iexact=compound)
@@ -124,49 +184,55 @@ def fetch_activities(chembl_id: str) -> list[dict]:
     ])
     return list(acts)
 
-def fetch_target_names(target_ids: set[str]) -> dict[str, str]:
+_TARGET_BATCH = 50  # IDs per ChEMBL request (keeps the URL well under length limits)
+
+def fetch_target_names(target_ids: list[str]) -> dict[str, str]:
+    """Resolve target IDs -> pref_name with one `__in` query per batch (not one per ID)."""
     tgt_client = new_client.target
     names = {}
-    for tid in target_ids:
-        rec = tgt_client.filter(target_chembl_id=tid).only(['pref_name'])
-        names[tid] = rec[0]['pref_name'] if rec else tid
-    return names
+    it = iter(target_ids)
+    while True:
+        batch = list(islice(it, _TARGET_BATCH))
+        if not batch:
+            break
+        recs = tgt_client.filter(target_chembl_id__in=batch).only(['target_chembl_id', 'pref_name'])
+        for r in recs:
+            names[r['target_chembl_id']] = r.get('pref_name') or r['target_chembl_id']
+    return {tid: names.get(tid, tid) for tid in target_ids}
+
+_ACT_COLUMNS = {
+    'target_chembl_id': 'Target',
+    'standard_type': 'Activity',
+    'standard_value': 'Value',
+    'standard_units': 'Units',
+}
+_KA_UNITS = {'M^-1', 'M-1', '1/M'}
+_KD_COL = 'Kd (nM) (from KA)'
 
 def build_activity_df(acts: list[dict]) -> pd.DataFrame:
-    rows = []
-    for a in acts:
-        tid   = a.get('target_chembl_id') or 'Unknown'
-        typ   = a.get('standard_type')    or ''
-        val   = a.get('standard_value')   or ''
-        unit  = a.get('standard_units')   or ''
-        kd_nm = ''
-        if typ and isinstance(typ, str) and typ.upper() == 'KA' and val:
-            u = (unit or '').strip()
-            if u in {'M^-1', 'M-1', '1/M'}:
-                try:
-                    kd_m  = 1.0 / float(val)
-                    kd_nm = round(kd_m * 1e9, 3)
-                except Exception:
-                    kd_nm = ''
-        rows.append({
-            'Target': tid,
-            'Activity': typ,
-            'Value': val,
-            'Units': unit,
-            'Kd (nM) (from KA)': kd_nm
-        })
-
-    df = pd.DataFrame(rows)
+    # Drop rows without a value before building the frame (no extra column scan)
+    rows = [a for a in acts if a.get('standard_value')]
+    df = pd.DataFrame(rows, columns=list(_ACT_COLUMNS)).rename(columns=_ACT_COLUMNS)
+    df[['Activity', 'Units']] = df[['Activity', 'Units']].fillna('')
     if df.empty:
         return df
+    df['Target'] = df['Target'].fillna('').replace('', 'Unknown')
 
-    unique_tids = set(df['Target'])
-    name_map = fetch_target_names(unique_tids)
-    df['Target'] = df['Target'].map(name_map)
+    # Ka (M^-1) -> Kd (nM), column-wise; non-numeric or zero values stay blank
+    mask = (df['Activity'].astype(str).str.upper() == 'KA') & df['Units'].astype(str).str.strip().isin(_KA_UNITS)
+    arr = pd.to_numeric(df['Value'], errors='coerce').to_numpy(dtype=np.float64)
+    kd = np.full_like(arr, np.nan)
+    np.reciprocal(arr, out=kd, where=mask.to_numpy() & (arr != 0))
+    kd = np.round(kd * 1e9, 3)
+    df[_KD_COL] = pd.Series(kd, index=df.index, dtype=object).where(np.isfinite(kd), '')
 
-    df = df[['Target', 'Activity', 'Value', 'Units', 'Kd (nM) (from KA)']]
-    df = df[df['Value'].astype(str).str.len() > 0].reset_index(drop=True)
-    return df
+    # Factorize once (C loop), resolve names for the uniques, then gather by code
+    codes, uniques = pd.factorize(df['Target'])
+    name_map = fetch_target_names(list(uniques))
+    name_arr = np.array([name_map.get(u, u) for u in uniques], dtype=object)
+    df['Target'] = name_arr[codes]
+
+    return df[['Target', 'Activity', 'Value', 'Units', _KD_COL]]
 
 # ----------------------------
 # PubChem helpers (ID + basic properties)
@@ -174,31 +240,41 @@ def build_activity_df(acts: list[dict]) -> pd.DataFrame:
 def _normalize_text(s: str) -> str:
     return unicodedata.normalize("NFKC", (s or "")).strip()
 
+class _LookupUnavailable(Exception):
+    """Every leg of a lookup failed at the transport level (no definitive answer)."""
+
 def pubchem_cid_from_name(name: str) -> int | None:
-    """Resolve name -> PubChem CID (PubChemPy → PUG JSON → TXT fallback)."""
+    """
+    Resolve name -> PubChem CID (PUG JSON → TXT → PubChemPy).
+    A definitive answer from the JSON endpoint (hit, 404, Fault, empty list) stops
+    there; the fallbacks only run when that request failed at the transport level.
+    """
     nm = _normalize_text(name)
     if not nm:
         return None
+    try:
+        return _pubchem_cid_lookup(nm)
+    except _LookupUnavailable:
+        return None  # not memoized: the next click retries the network
 
-    if _PCP:
-        try:
-            cids = pcp.get_cids(nm, namespace='name')
-            if cids:
-                return int(cids[0])
-        except Exception:
-            pass
-
+@functools.lru_cache(maxsize=512)
+def _pubchem_cid_lookup(nm: str) -> int | None:
+    """Memoized body of pubchem_cid_from_name; raises _LookupUnavailable instead of caching a failure."""
     # JSON first
     url_json = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{quote(nm)}/cids/JSON"
     r = _http_get(url_json, timeout=35.0)
-    if r and r.ok:
+    if r is not None:
+        if r.status_code == 404:
+            return None
         try:
-            js = r.json()
+            js = _json_loads(r.content)
+            if js.get('Fault'):
+                return None
             ids = js.get('IdentifierList', {}).get('CID', [])
-            if ids:
-                return int(ids[0])
+            return int(ids[0]) if ids else None
         except Exception:
-            pass
+            if not r.ok:
+                return None
 
     # TXT fallback
     url_txt = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{quote(nm)}/cids/TXT"
@@ -215,23 +291,39 @@ def pubchem_cid_from_name(name: str) -> int | None:
         except Exception:
             pass
 
-    return None
+    # PubChemPy last: slower to import and bypasses our session/retries
+    if _PCP:
+        try:
+            cids = pcp.get_cids(nm, namespace='name')
+            if cids:
+                return int(cids[0])
+        except Exception:
+            pass
+
+    raise _LookupUnavailable(nm)
+
+_BASIC_PROPS = [
+    'IUPACName', 'MolecularFormula', 'MolecularWeight',
+    'CanonicalSMILES', 'IsomericSMILES', 'InChIKey',
+    'XLogP', 'ExactMass', 'TPSA',
+    'HBondDonorCount', 'HBondAcceptorCount',
+    'RotatableBondCount', 'FormalCharge'
+]
+# Most specific first; PubChem now reports Isomeric/Canonical as SMILES/ConnectivitySMILES
+_SMILES_KEYS = ['IsomericSMILES', 'SMILES', 'Isomeric SMILES',
+                'CanonicalSMILES', 'ConnectivitySMILES', 'Canonical SMILES']
 
 def pubchem_basic_props_df(cid: int) -> pd.DataFrame:
-    """Compact identifiers/descriptors table. Prefers PubChemPy; falls back to PUG-View."""
-    if _PCP:
+    """Compact identifiers/descriptors table (one PUG-REST property call); falls back to PUG-View."""
+    url = (f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/property/"
+           f"{','.join(_BASIC_PROPS)}/JSON")
+    r = _http_get(url, timeout=35.0)
+    if r and r.ok:
         try:
-            props = [
-                'IUPACName', 'MolecularFormula', 'MolecularWeight',
-                'CanonicalSMILES', 'IsomericSMILES', 'InChIKey',
-                'XLogP', 'ExactMass', 'TPSA',
-                'HBondDonorCount', 'HBondAcceptorCount',
-                'RotatableBondCount', 'FormalCharge'
-            ]
-            df = pcp.get_properties(props, cid, as_dataframe=True)
-            df.insert(0, 'Source', 'PubChem (computed)')
-            tidy = df.T.reset_index().rename(columns={'index': 'Property', 0: 'Value'})
-            return tidy
+            rec = _json_loads(r.content)['PropertyTable']['Properties'][0]
+            rows = [('PubChem (computed)', k, v) for k, v in rec.items() if k != 'CID']
+            if rows:
+                return pd.DataFrame(rows, columns=['Source', 'Property', 'Value'])
         except Exception:
             pass
     # PUG-View fallback
@@ -240,7 +332,7 @@ def pubchem_basic_props_df(cid: int) -> pd.DataFrame:
         r = _http_get(url, timeout=35.0)
         if not r or not r.ok:
             return pd.DataFrame(columns=['Source','Property','Value'])
-        data = r.json()
+        data = _json_loads(r.content)
         props = []
         record = data.get('Record', {})
         def pick_strings(sections, wanted):
@@ -265,22 +357,39 @@ def pubchem_basic_props_df(cid: int) -> pd.DataFrame:
 # ----------------------------
 # PubChem helpers (robust property walker)
 # ----------------------------
-def _flatten_string_with_markup(obj) -> str:
-    out = []
+_END = object()
+
+def _markup_frame(obj, parts: list):
+    """One level of a StringWithMarkup/List node: own strings go to `parts`, children are returned."""
     if isinstance(obj, dict):
         if 'String' in obj:
-            out.append(str(obj.get('String', '')))
-        if 'StringWithMarkup' in obj:
-            for item in obj['StringWithMarkup']:
-                out.append(_flatten_string_with_markup(item))
-        if 'List' in obj:
-            for item in obj['List']:
-                out.append(_flatten_string_with_markup(item))
-    elif isinstance(obj, list):
-        for item in obj:
-            out.append(_flatten_string_with_markup(item))
-    elif obj is not None:
-        out.append(str(obj))
+            parts.append(str(obj.get('String', '')))
+        return iter([*(obj.get('StringWithMarkup') or []), *(obj.get('List') or [])])
+    if isinstance(obj, list):
+        return iter(obj)
+    if obj is not None:
+        parts.append(str(obj))
+    return iter(())
+
+def _flatten(obj, out: list) -> None:
+    """Push the top-level strings of `obj` onto `out`; each child contributes its own joined text."""
+    # Explicit stack of (parts, children) frames -- PUG-View values can nest deeply.
+    # A finished child is joined and stripped before being handed to its parent, as before.
+    stack = [(out, _markup_frame(obj, out))]
+    while stack:
+        parts, children = stack[-1]
+        child = next(children, _END)
+        if child is not _END:
+            child_parts = []
+            stack.append((child_parts, _markup_frame(child, child_parts)))
+            continue
+        stack.pop()
+        if stack:
+            stack[-1][0].append(" ".join(s for s in parts if s).strip())
+
+def _flatten_string_with_markup(obj) -> str:
+    out = []
+    _flatten(obj, out)
     return " ".join(s for s in out if s).strip()
 
 def _flatten_table(tbl: dict) -> str:
@@ -316,40 +425,95 @@ def _extract_value_from_information(info: dict) -> str | None:
         return _flatten_table(tbl)
     return None
 
+# Top-level PUG-View sections worth walking; the rest (literature, patents, ...) is skipped
+_PUGVIEW_SECTIONS = {
+    'Names and Identifiers',
+    'Chemical and Physical Properties',
+    'Experimental Properties',
+    'Computed Properties',
+}
+
+def _pugview_sections(cid: int) -> list[dict] | None:
+    """Allow-listed top-level PUG-View sections; streamed with ijson when reading from the socket."""
+    url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON"
+    # ijson is optional and only used without requests-cache: a cached session buffers the
+    # body to store it, so there is nothing left to stream
+    stream = _IJSON and not _RQC
+    r = _http_get(url, timeout=40.0, stream=stream)
+    if r is None:
+        return None
+    try:
+        if not r.ok:
+            return None
+        if not stream:
+            # Body already in memory: a full orjson decode beats re-tokenizing it with ijson
+            sections = _json_loads(r.content).get('Record', {}).get('Section', [])
+            return [s for s in sections if s.get('TOCHeading') in _PUGVIEW_SECTIONS]
+        r.raw.decode_content = True
+        # One top-level section in memory at a time; unwanted ones are dropped as they complete
+        return [s for s in ijson.items(r.raw, 'Record.Section.item')
+                if s.get('TOCHeading') in _PUGVIEW_SECTIONS]
+    finally:
+        r.close()
+
 def pubchem_properties_all(cid: int) -> pd.DataFrame:
     try:
-        url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON"
-        r = _http_get(url, timeout=40.0)
-        if not r or not r.ok:
+        sections = _pugview_sections(cid)
+        if sections is None:
             return pd.DataFrame(columns=['Property','Value','Source'])
-        js = r.json()
     except Exception:
         return pd.DataFrame(columns=['Property','Value','Source'])
 
-    out = []
-    def walk(sections, path):
-        for s in sections:
-            heading = s.get('TOCHeading') or s.get('Name') or ""
-            new_path = path + ([heading] if heading else [])
-            for info in s.get('Information', []):
-                name = (info.get('Name') or heading or "Property").strip()
-                val = _extract_value_from_information(info)
-                if val:
-                    src = " > ".join(p for p in new_path if p)
-                    out.append((name, val.strip(), src))
-            if 'Table' in s and isinstance(s['Table'], dict):
-                t_str = _flatten_table(s['Table'])
-                if t_str:
-                    src = " > ".join(p for p in new_path if p)
-                    title = s['Table'].get('Title') or heading or "Table"
-                    out.append((title.strip(), t_str.strip(), src))
-            if 'Section' in s:
-                walk(s['Section'], new_path)
-    record = js.get('Record', {})
-    walk(record.get('Section', []), path=[])
-    df = pd.DataFrame(out, columns=['Property','Value','Source']).drop_duplicates()
+    # Pre-order walk over nested sections with an explicit stack (no recursion)
+    out, seen = [], set()  # rows deduplicated as they're found, not via drop_duplicates()
+    stack = [(s, ()) for s in reversed(sections)]
+    while stack:
+        s, path = stack.pop()
+        heading = s.get('TOCHeading') or s.get('Name') or ""
+        new_path = path + (heading,) if heading else path
+        src = " > ".join(new_path)
+        for info in s.get('Information', []):
+            name = (info.get('Name') or heading or "Property").strip()
+            val = _extract_value_from_information(info)
+            if val:
+                row = (name, val.strip(), src)
+                if row not in seen:
+                    seen.add(row)
+                    out.append(row)
+        if 'Table' in s and isinstance(s['Table'], dict):
+            t_str = _flatten_table(s['Table'])
+            if t_str:
+                title = s['Table'].get('Title') or heading or "Table"
+                row = (title.strip(), t_str.strip(), src)
+                if row not in seen:
+                    seen.add(row)
+                    out.append(row)
+        stack.extend((c, new_path) for c in reversed(s.get('Section') or []))
+    df = pd.DataFrame(out, columns=['Property','Value','Source'])
     return df
 
+_EXP_PATTERNS = [
+    r'\bmelting point\b',
+    r'\bboiling point\b',
+    r'\bsolubilit(?:y|ies)\b',
+    r'\bpK(?:a|A)\b',
+    r'\bpH\b',
+    r'\blog\s*P\b',
+    r'\bX?logP.*',
+    r'\bdensity\b',
+    r'\bvapou?r pressure\b',
+    r'\bflash point\b',
+    r'\bappearance\b',
+    r'\bcolor/?form\b',
+]
+_FB_PATTERNS = [
+    r'\bdescriptor\b', r'\bphysical\b', r'\bchemical\b',
+    r'\bpartition\b', r'\bacid dissociation\b'
+]
+# Compiled once at import; reused for every search
+_EXP_RX = re.compile("|".join(_EXP_PATTERNS), re.IGNORECASE)
+_FB_RX = re.compile("|".join(_FB_PATTERNS), re.IGNORECASE)
+
 def pubchem_experimental_props_df(cid: int) -> pd.DataFrame:
     """
     Return prioritized subset of properties; if none found, return the full set.
@@ -359,43 +523,34 @@ def pubchem_experimental_props_df(cid: int) -> pd.DataFrame:
     if df_all.empty:
         return df_all
 
-    patterns = [
-        r'\bmelting point\b',
-        r'\bboiling point\b',
-        r'\bsolubilit(?:y|ies)\b',
-        r'\bpK(?:a|A)\b',
-        r'\bpH\b',
-        r'\blog\s*P\b',
-        r'\bX?logP.*',
-        r'\bdensity\b',
-        r'\bvapou?r pressure\b',
-        r'\bflash point\b',
-        r'\bappearance\b',
-        r'\bcolor/?form\b',
-    ]
-    rx = re.compile("|".join(patterns), re.IGNORECASE)
-
-    prop_hit = df_all["Property"].str.contains(rx, na=False)
-    src_hit  = df_all    ["Source"].str.contains(rx, na=False)
-    df_sub = df_all[prop_hit | src_hit]
+    # One regex pass over "Property ¦ Source" instead of one per column
+    hay = df_all["Property"].str.cat(df_all["Source"], sep=" ¦ ")
+    df_sub = df_all[hay.str.contains(_EXP_RX, na=False)]
 
     if not df_sub.empty:
         return df_sub
 
-    fallback_patterns = [
-        r'\bdescriptor\b', r'\bphysical\b', r'\bchemical\b',
-        r'\bpartition\b', r'\bacid dissociation\b'
-    ]
-    rx2 = re.compile("|".join(fallback_patterns), re.IGNORECASE)
-    fb_hit = df_all["Source"].str.contains(rx2, na=False)
+    fb_hit = df_all["Source"].str.contains(_FB_RX, na=False)
     df_fb = df_all[fb_hit]
 
     return df_fb if not df_fb.empty else df_all
 
+def smiles_from_props_df(df: pd.DataFrame) -> str | None:
+    """Pick a SMILES string out of the basic-properties table (no extra request)."""
+    if df.empty:
+        return None
+    vals = dict(zip(df['Property'], df['Value']))
+    for k in _SMILES_KEYS:
+        if vals.get(k):
+            return str(vals[k])
+    return None
+
 # ----------------------------
 # Rendering helpers
 # ----------------------------
-def rdkit_image_from_smiles(smiles: str, size=(320, 320)):
+@functools.lru_cache(maxsize=64)
+def rdkit_image_from_smiles(smiles: str, size=(320, 320)) -> bytes | None:
+    """2D depiction as PNG bytes; cached per (SMILES, size) so re-renders skip coord generation."""
     if not _RDKIT:
         return None
     try:
@@ -403,7 +558,9 @@ def rdkit_image_from_smiles(smiles: str, size=(320, 320)):
         if mol is None:
             return None
         AllChem.Compute2DCoords(mol)
-        return Draw.MolToImage(mol, size=size)
+        buf = io.BytesIO()
+        Draw.MolToImage(mol, size=size).save(buf, format="PNG")
+        return buf.getvalue()
     except Exception:
         return None
 
@@ -447,19 +604,63 @@ def sort_dataframe(df: pd.DataFrame, by: str, ascending: bool) -> pd.DataFrame:
 # ----------------------------
 # Download links
 # ----------------------------
+_DOWNLOAD_CACHE = OrderedDict()  # (digest, filename, filetype, sep) -> <a> tag
+_DOWNLOAD_CACHE_SIZE = 32
+# xlsxwriter is much faster than openpyxl at writing; None lets pandas pick its default
+_XLSX_ENGINE = "xlsxwriter" if _XLSXW else None
+
+# Left unescaped in CSV data URIs (never includes quotes, '&', '<', '>' or whitespace)
+_CSV_URI_SAFE = ",;:/.-_()+"
+
+def _df_digest(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (values + column names, index ignored)."""
+    h = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update("\x1f".join(map(str, df.columns)).encode())
+    return h.hexdigest()
+
 def make_download_link(df: pd.DataFrame, filename: str, filetype: str = "csv", sep: str = ",") -> str:
     if df is None or df.empty:
         return "<em>No data to download</em>"
+    if filetype not in ("csv", "xlsx"):
+        raise ValueError("Unsupported type")
+
+    # Re-renders with unchanged tables reuse the previously encoded payload
+    key = (_df_digest(df), filename, filetype, sep)
+    link = _DOWNLOAD_CACHE.get(key)
+    if link is not None:
+        _DOWNLOAD_CACHE.move_to_end(key)
+        return link
+
     if filetype == "csv":
+        # Percent-encoded text is smaller than base64 for mostly-ASCII CSV
         buf = io.StringIO(); df.to_csv(buf, index=False, sep=sep)
-        data, mime = buf.getvalue(), "text/csv"
-    elif filetype == "xlsx":
-        buf = io.BytesIO(); df.to_excel(buf, index=False)
-        data, mime = buf.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        href = "data:text/csv;charset=utf-8," + quote(buf.getvalue(), safe=_CSV_URI_SAFE)
     else:
-        raise ValueError("Unsupported type")
-    b64 = base64.b64encode(data.encode() if isinstance(data, str) else data).decode()
-    return f'<a download="{filename}" href="data:{mime};base64,{b64}">⬇️ Download {filename}</a>'
+        buf = io.BytesIO(); df.to_excel(buf, index=False, engine=_XLSX_ENGINE)
+        mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        href = f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode()}"
+    link = f'<a download="{filename}" href="{href}">⬇️ Download {filename}</a>'
+
+    _DOWNLOAD_CACHE[key] = link
+    if len(_DOWNLOAD_CACHE) > _DOWNLOAD_CACHE_SIZE:
+        _DOWNLOAD_CACHE.popitem(last=False)
+    return link
+
+def xlsx_download_button(df: pd.DataFrame, filename: str) -> widgets.Widget:
+    """Button that builds the XLSX link only when clicked (Excel serialization is the slow part)."""
+    if df is None or df.empty:
+        return widgets.HTML("<em>No data to download</em>")
+    btn = widgets.Button(description=f"Prepare {filename}", icon="download")
+    link_out = widgets.Output()
+
+    def on_prepare(_):
+        btn.disabled = True
+        with link_out:
+            display(HTML(make_download_link(df, filename, "xlsx")))
+        btn.layout.display = "none"
+
+    btn.on_click(on_prepare)
+    return widgets.HBox([btn, link_out])
 
 # ----------------------------
 # Interactive UI
@@ -515,12 +716,31 @@ def interactive_mode():
             display(Markdown(f"## Results for **{compound}**"))
             display(Markdown("Data sources: **ChEMBL** (bioactivity), **PubChem** (structure & properties)."))
 
+            # ChEMBL and PubChem are independent: start both now, render ChEMBL first.
+            # The per-CID PubChem requests are queued as soon as the CID resolves, so they
+            # run while the ChEMBL table is still being built and rendered.
+            pub_pool = ThreadPoolExecutor(max_workers=_PUBCHEM_WORKERS)
+
+            def pubchem_jobs():
+                cid = pubchem_cid_from_name(compound)
+                if cid is None:
+                    return None, {}
+                return cid, {
+                    'basic': pub_pool.submit(pubchem_basic_props_df, cid),
+                    'png':   None if _RDKIT else pub_pool.submit(pubchem_png_image, cid, 320),
+                    '3d':    pub_pool.submit(py3dmol_view_from_pubchem_cid, cid),
+                    'exp':   pub_pool.submit(pubchem_experimental_props_df, cid),
+                }
+
+            lookups = ThreadPoolExecutor(max_workers=2)
+            f_chembl = lookups.submit(lambda: build_activity_df(fetch_activities(get_chembl_id(compound))))
+            f_pub = lookups.submit(pubchem_jobs)
+            lookups.shutdown(wait=False)
+
             # --- ChEMBL PD table
             df_pd = pd.DataFrame()
             try:
-                chembl_id = get_chembl_id(compound)
-                acts = fetch_activities(chembl_id)
-                df_pd = build_activity_df(acts)
+                df_pd = f_chembl.result()
 
                 if not df_pd.empty:
                     selected = list(act_filter.value)
@@ -532,69 +752,70 @@ def interactive_mode():
                     show(df_pd, classes="display compact cell-border", maxBytes=0, pageLength=50)
 
                     display(HTML(make_download_link(df_pd, "bioactivity.csv", "csv", sep=sep_choice.value)))
-                    display(HTML(make_download_link(df_pd, "bioactivity.xlsx", "xlsx")))
+                    display(xlsx_download_button(df_pd, "bioactivity.xlsx"))
                 else:
                     display(Markdown("> No human bioactivity rows returned by ChEMBL."))
             except Exception as e:
                 display(Markdown(f"**ChEMBL error:** {e}"))
 
             # --- PubChem: CID, 2D image, 3D viewer, properties
-            cid = None
+            cid, futs = None, {}
             try:
-                cid = pubchem_cid_from_name(compound)
+                cid, futs = f_pub.result()
             except Exception:
                 cid = None
 
-            if cid is None:
-                display(Markdown("> PubChem lookup failed; structure/properties unavailable."))
-                return
-
-            display(Markdown(f"### PubChem\nCID: **{cid}**"))
-
-            df_basic = pubchem_basic_props_df(cid)
-            if not df_basic.empty:
-                show(df_basic, classes="display compact cell-border", maxBytes=0, pageLength=50)
-                display(HTML(make_download_link(df_basic, "pubchem_basic.csv", "csv", sep=sep_choice.value)))
-
-            # 2D structure
-            smiles = None
-            if _PCP:
-                try:
-                    comps = pcp.get_compounds([cid], 'cid')
-                    if comps:
-                        smiles = comps[0].isomeric_smiles or comps[0].canonical_smiles
-                except Exception:
-                    smiles = None
-
-            display(Markdown("#### 2D Structure"))
-            img = rdkit_image_from_smiles(smiles) if smiles else None
-            if img is not None:
-                display(img)
-            else:
-                png = pubchem_png_image(cid, size=320)
-                if png:
-                    display(Image(png))
+            try:
+                if cid is None:
+                    display(Markdown("> PubChem lookup failed; structure/properties unavailable."))
+                    return
+
+                display(Markdown(f"### PubChem\nCID: **{cid}**"))
+
+                # Each section blocks only on its own request; the others keep downloading meanwhile.
+                df_basic = futs['basic'].result()
+                smiles = smiles_from_props_df(df_basic)
+                img = rdkit_image_from_smiles(smiles) if smiles else None
+                # RDKit couldn't draw it: start the PNG fallback now so it overlaps the in-flight SDF fetch
+                f_png = futs['png']
+                if img is None and f_png is None:
+                    f_png = pub_pool.submit(pubchem_png_image, cid, 320)
+
+                if not df_basic.empty:
+                    show(df_basic, classes="display compact cell-border", maxBytes=0, pageLength=50)
+                    display(HTML(make_download_link(df_basic, "pubchem_basic.csv", "csv", sep=sep_choice.value)))
+
+                # 2D structure
+                display(Markdown("#### 2D Structure"))
+                if img is not None:
+                    display(Image(img))
+                else:
+                    png = f_png.result()
+                    if png:
+                        display(Image(png))
+                    else:
+                        display(Markdown("> Unable to render 2D structure (RDKit and PNG fallback both failed)."))
+
+                # 3D structure
+                display(Markdown("#### 3D Structure (interactive)"))
+                viewer = futs['3d'].result()
+                if viewer is not None:
+                    viewer.show()
+                else:
+                    msg = "py3Dmol not available" if not _P3D else "No PubChem 3D conformer found or retrieval failed"
+                    display(Markdown(f"> 3D viewer unavailable: {msg}."))
+
+                # Experimental/Computed properties (robust)
+                display(Markdown("#### Experimental / Computed Properties (PubChem)"))
+                df_exp = futs['exp'].result()
+                if not df_exp.empty:
+                    show(df_exp, classes="display compact cell-border", maxBytes=0, pageLength=50)
+                    display(HTML(make_download_link(df_exp, "pubchem_properties.csv", "csv", sep=sep_choice.value)))
+                    display(xlsx_download_button(df_exp, "pubchem_properties.xlsx"))
                 else:
-                    display(Markdown("> Unable to render 2D structure (RDKit and PNG fallback both failed)."))
-
-            # 3D structure
-            display(Markdown("#### 3D Structure (interactive)"))
-            viewer = py3dmol_view_from_pubchem_cid(cid)
-            if viewer is not None:
-                viewer.show()
-            else:
-                msg = "py3Dmol not available" if not _P3D else "No PubChem 3D conformer found or retrieval failed"
-                display(Markdown(f"> 3D viewer unavailable: {msg}."))
-
-            # Experimental/Computed properties (robust)
-            display(Markdown("#### Experimental / Computed Properties (PubChem)"))
-            df_exp = pubchem_experimental_props_df(cid)
-            if not df_exp.empty:
-                show(df_exp, classes="display compact cell-border", maxBytes=0, pageLength=50)
-                display(HTML(make_download_link(df_exp, "pubchem_properties.csv", "csv", sep=sep_choice.value)))
-                display(HTML(make_download_link(df_exp, "pubchem_properties.xlsx", "xlsx")))
-            else:
-                display(Markdown("> No experimental/computed properties found (or parse failed)."))
+                    display(Markdown("> No experimental/computed properties found (or parse failed)."))
+            finally:
+                pub_pool.shutdown(wait=False)
 
     run_btn.on_click(on_click)
     display(widgets.VBox([controls, filters, out]))